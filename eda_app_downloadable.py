@@ -3,12 +3,23 @@ import streamlit as st
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import numpy as np
 import io
+import os
+import hashlib
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # 日本語フォントの文字化け対策
 import japanize_matplotlib
 
+# 密な折れ線・散布図の描画を速くするため、見た目に影響しない点を間引いて描画する
+plt.rcParams['path.simplify'] = True
+plt.rcParams['path.simplify_threshold'] = 1.0
+plt.rcParams['agg.path.chunksize'] = 10000
+
 # --- Streamlitアプリの基本設定 ---
 st.set_page_config(page_title="全自動EDAレポートツール", page_icon="📝", layout="wide")
 st.title("📝 全自動EDA（探索的データ分析）レポートツール")
@@ -17,39 +28,382 @@ st.write("ファイルをアップロードするだけで、データ分析レ
 # --- Session Stateの初期化 ---
 if 'df' not in st.session_state:
     st.session_state.df = None
+    st.session_state.df_key = None
+    st.session_state.file_id = None
+    st.session_state.file_hash = None
+    st.session_state.numeric_cols = []
+    st.session_state.datetime_cols = []
+    st.session_state.categorical_cols = []
 
 # --- ヘルパー関数 ---
-def create_download_button(fig, file_name, label="このグラフをダウンロード"):
-    """Matplotlibのグラフオブジェクトからダウンロードボタンを生成する"""
+def detect_date_columns(df, n_rows=1000):
+    """文字列列の先頭行を調べ、同じ書式の日付・時刻だけが入っている列名と日付の区切り文字を返す"""
+    pattern = r'^\d{4}([-/])\d{2}\1\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)?$'
+    date_cols = {}
+    for col_name in df.select_dtypes(include='object').columns:
+        values = df[col_name].head(n_rows).dropna()
+        if values.empty or pd.api.types.infer_dtype(values) != 'string':
+            continue
+        # 書式の合わない値はNaNになる
+        separators = values.str.strip().str.extract(pattern)[0]
+        if separators.notna().all() and separators.nunique() == 1:
+            date_cols[col_name] = separators.iloc[0]
+    return date_cols
+
+def parse_date_columns(df, n_rows=1000):
+    """日付らしい列をdatetime型に変換する（同じ日付文字列の変換結果は使い回す）"""
+    # pyarrowエンジンは日付だけの列をdatetime.dateのobject列として返すため、datetime型に揃える
+    for col_name in df.select_dtypes(include='object').columns:
+        values = df[col_name].head(n_rows).dropna()
+        if values.empty or pd.api.types.infer_dtype(values) not in ('date', 'datetime'):
+            continue
+        try:
+            parsed = pd.to_datetime(df[col_name])
+        except (ValueError, TypeError):
+            continue
+        if parsed.isna().sum() == df[col_name].isna().sum():
+            df[col_name] = parsed
+
+    for col_name, separator in detect_date_columns(df).items():
+        values = df[col_name].str.strip()
+        if separator == '/':
+            values = values.str.replace('/', '-', regex=False)
+        try:
+            parsed = pd.to_datetime(values, format='ISO8601', cache=True)
+        except (ValueError, TypeError):
+            # 先頭行より後に日付でない値が含まれる列は、文字列のまま残す
+            continue
+        # 文字列以外の値が欠損値に変わってしまう場合も、変換しない
+        if parsed.isna().sum() == df[col_name].isna().sum():
+            df[col_name] = parsed
+    return df
+
+def read_file(name, data):
+    """ファイル名の拡張子に応じてCSVまたはExcelを読み込む"""
+    if name.endswith('.csv'):
+        try:
+            # pyarrowのマルチスレッドCSVリーダーで読み込む
+            df = pd.read_csv(io.BytesIO(data), engine='pyarrow')
+        except Exception:
+            # pyarrowで読めない形式の場合は標準のCエンジンで読み直す
+            df = pd.read_csv(io.BytesIO(data))
+        # どちらのエンジンで読んでも日付列の型が同じになるよう、読み込み後に変換する
+        return parse_date_columns(df)
+    try:
+        # python-calamine（Rust製リーダー）が入っていれば高速に読み込む
+        return pd.read_excel(io.BytesIO(data), engine='calamine')
+    except ImportError:
+        return pd.read_excel(io.BytesIO(data))
+
+# 読み込んだデータをParquet形式で保存しておくディスクキャッシュ（新しい順にCACHE_MAX_FILES件まで保持）
+CACHE_DIR = Path.home() / ".cache" / "eda-app"
+CACHE_MAX_FILES = 20
+# 読み込み・変換処理を変更したら番号を上げ、古い処理で作られたキャッシュを使わないようにする
+CACHE_VERSION = 3
+
+def disk_cache_path(df_key):
+    """キャッシュファイルのパスを返す"""
+    return CACHE_DIR / f"v{CACHE_VERSION}-{df_key}.parquet"
+
+def read_disk_cache(df_key):
+    """ディスクキャッシュにあるDataFrameを読み込む（無ければNone）"""
+    cache_path = disk_cache_path(df_key)
+    if not cache_path.exists():
+        return None
+    try:
+        df = pd.read_parquet(cache_path)
+    except Exception:
+        return None
+    cache_path.touch() # 最近使ったファイルとして更新日時を新しくする
+    return df
+
+def write_disk_cache(df_key, df):
+    """DataFrameをディスクキャッシュに保存し、古いファイルを削除する"""
+    tmp_path = None
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # 同じファイルを同時に保存するセッションがあっても混ざらないよう、一時ファイル名は毎回別にする
+        with tempfile.NamedTemporaryFile(dir=CACHE_DIR, suffix=".tmp", delete=False) as tmp_file:
+            tmp_path = Path(tmp_file.name)
+        df.to_parquet(tmp_path)
+        tmp_path.replace(disk_cache_path(df_key))
+        cached_files = sorted(CACHE_DIR.glob("*.parquet"), key=lambda p: p.stat().st_mtime, reverse=True)
+        for old_path in cached_files[CACHE_MAX_FILES:]:
+            old_path.unlink(missing_ok=True)
+    except Exception:
+        # Parquetに変換できない列がある場合などは、キャッシュせずにそのまま使う
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_data(df_key, _uploaded_file, downcast=False):
+    """アップロードされたファイルをDataFrameに読み込む（ファイル内容から求めたキーごとにキャッシュ）"""
+    df = read_disk_cache(df_key)
+    if df is not None:
+        return df
+    df = read_file(_uploaded_file.name, _uploaded_file.getvalue())
+    if downcast:
+        # メモリ節約モード: 数値列を値が収まる最小の型に変換する（float64→float32など）
+        for col_name in df.select_dtypes(include=np.number).columns:
+            kind = 'float' if df[col_name].dtype.kind == 'f' else 'integer'
+            df[col_name] = pd.to_numeric(df[col_name], downcast=kind)
+    # 重複の多い文字列列はカテゴリ型にして、件数集計を整数コードで行えるようにする
+    for col_name in df.select_dtypes(include='object').columns:
+        if df[col_name].nunique() * 2 < len(df):
+            df[col_name] = df[col_name].astype('category')
+    write_disk_cache(df_key, df)
+    return df
+
+# 行数がSUMMARY_MAX_ROWSを超える場合、概要の統計量はサンプリングした行から概算する
+SUMMARY_MAX_ROWS = 500_000
+SUMMARY_SAMPLE_ROWS = 200_000
+
+def sample_rows(df):
+    """概要の集計に使う行を返す（大きなデータは一部の行のみ）"""
+    if len(df) > SUMMARY_MAX_ROWS:
+        return df.sample(SUMMARY_SAMPLE_ROWS, random_state=0)
+    return df
+
+# 以下の集計関数は、DataFrame自体のハッシュ計算を避けるため
+# ファイル内容から求めたキー(df_key)でキャッシュする（_dfはハッシュ対象外）
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_describe(df_key, _df):
+    """全列の基本統計量を計算する"""
+    # メモリ節約モードで縮めた浮動小数点列は、精度のためfloat64に戻して集計する
+    sample = sample_rows(_df)
+    float32_cols = sample.select_dtypes(include='float32').columns
+    return sample.astype({c: 'float64' for c in float32_cols}).describe(include='all')
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_column_summary(df_key, _df, numeric_cols):
+    """列ごとの欠損値の数と、数値列の最小値・最大値・平均・標準偏差を計算する"""
+    # 欠損値の数は全行から正確に求め、その他の統計量は基本統計量と同じサンプルから求める
+    sample = sample_rows(_df)
+
+    def summarize(col_name):
+        series = _df[col_name]
+        # isnull()の真偽値配列を作らず、非欠損数(count)から欠損値の数を求める
+        row = {"欠損値の数": len(series) - series.count()}
+        if col_name in numeric_cols:
+            values = sample[col_name]
+            row.update({"最小値": values.min(), "最大値": values.max(), "平均": values.mean(), "標準偏差": values.std()})
+        return row
+
+    # pandasの集計はGILを解放するため、列ごとにスレッドで並列に計算する
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        rows = list(executor.map(summarize, _df.columns))
+    return pd.DataFrame(rows, index=_df.columns, columns=["欠損値の数", "最小値", "最大値", "平均", "標準偏差"])
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def compute_column_describe(df_key, _df, col_name):
+    """1列分の統計量を計算する（数値列には分散も加える）"""
+    series = _df[col_name]
+    if not pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_datetime64_any_dtype(series):
+        # 文字列・カテゴリ列は、集計済みのカテゴリ別件数から求める（件数の再集計をしない）
+        value_counts = compute_value_counts(df_key, _df, col_name)
+        value_counts = value_counts[value_counts > 0]
+        return pd.Series({
+            "count": int(value_counts.sum()),
+            "unique": len(value_counts),
+            "top": value_counts.index[0] if len(value_counts) else np.nan,
+            "freq": int(value_counts.iloc[0]) if len(value_counts) else np.nan,
+        }, name=col_name)
+    if series.dtype == 'float32':
+        # メモリ節約モードで縮めた列は、精度のためfloat64に戻して集計する
+        series = series.astype('float64')
+    stats_df = series.describe()
+    if pd.api.types.is_numeric_dtype(series):
+        stats_df['variance'] = series.var()
+    return stats_df
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def compute_value_counts(df_key, _df, col_name):
+    """列のカテゴリ別件数を多い順に計算する"""
+    return _df[col_name].value_counts()
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def compute_corr(df_key, _df, numeric_cols):
+    """数値列同士の相関係数を計算する"""
+    return _df[list(numeric_cols)].corr()
+
+def sample_values(values, max_samples):
+    """配列が大きすぎる場合、描画用に非復元抽出で件数を減らす"""
+    if values.size > max_samples:
+        return np.random.default_rng(0).choice(values, max_samples, replace=False)
+    return values
+
+def compute_kde(values, n_points=200, max_samples=10_000):
+    """ガウスカーネル密度推定の曲線を計算する（大きな列はサンプリングしてから計算）"""
+    values = sample_values(values, max_samples)
+    std = values.std()
+    if values.size < 2 or std == 0:
+        return None
+    bandwidth = std * values.size ** (-1 / 5) # Scottの規則
+    grid = np.linspace(values.min(), values.max(), n_points)
+    z = (grid[:, None] - values[None, :]) / bandwidth
+    density = np.exp(-0.5 * z ** 2).sum(axis=1) / (values.size * bandwidth * np.sqrt(2 * np.pi))
+    return grid, density
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def compute_numeric_stats(df_key, _df, col_name):
+    """数値列の最小値・最大値・四分位数・ひげの位置・KDEをまとめて計算する（ビン数に依存しない部分）"""
+    values = _df[col_name].dropna().to_numpy(dtype=float)
+    values = values[np.isfinite(values)]
+    if values.size == 0:
+        return None
+    # 最小値・最大値・四分位数を1回の部分ソートでまとめて求める
+    v_min, q1, med, q3, v_max = np.quantile(values, [0, .25, .5, .75, 1])
+    iqr = q3 - q1
+    return {
+        "box": {
+            "med": med, "q1": q1, "q3": q3,
+            "whislo": values[values >= q1 - 1.5 * iqr].min(),
+            "whishi": values[values <= q3 + 1.5 * iqr].max(),
+            "fliers": [],
+        },
+        "range": (float(v_min), float(v_max)),
+        "kde": compute_kde(values),
+        "size": values.size,
+    }
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def compute_histogram(df_key, _df, col_name, bins, value_range):
+    """数値列のヒストグラムの度数と区切りを計算する"""
+    # 範囲を指定したnp.histogramは範囲外の値やNaNを数えないため、欠損値を除くコピーを作らずに1パスで集計できる
+    values = _df[col_name].to_numpy(dtype=float, na_value=np.nan)
+    return np.histogram(values, bins=bins, range=value_range)
+
+def lttb(x, y, n_out=2000):
+    """LTTB(Largest-Triangle-Three-Buckets)法で折れ線をn_out点に間引き、残す点の位置を返す"""
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # 先頭と末尾を除いた点をn_out-2個のバケツに分け、各バケツから1点ずつ選ぶ
+    bucket_edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = bucket_edges[i], bucket_edges[i + 1]
+        if i + 2 < len(bucket_edges):
+            next_start, next_end = bucket_edges[i + 1], bucket_edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        # 直前に選んだ点・次のバケツの平均点と作る三角形の面積が最大の点を選ぶ
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        indices[i + 1] = a
+    return indices
+
+def downsample_series(df, time_col, col_name, n_out=2000):
+    """時刻列に対する1列の推移を、時刻順に並べてから描画用にLTTBで間引く"""
+    series = df[[time_col, col_name]].dropna().sort_values(time_col).set_index(time_col)[col_name]
+    x = series.index.asi8.astype(float)
+    y = series.to_numpy(dtype=float)
+    indices = lttb(x, y, n_out)
+    return series.index[indices], y[indices]
+
+def render_png(fig):
+    """FigureをPNG画像のバイト列に変換する（st.pyplotと同じ解像度で描画する）"""
     buf = io.BytesIO()
-    fig.savefig(buf, format="png", bbox_inches='tight')
+    fig.savefig(buf, format="png", dpi=200, bbox_inches='tight')
+    return buf.getvalue()
+
+# 以下のグラフ生成関数は、描画したグラフをPNGのバイト列にしてキャッシュする
+# （表示とダウンロードで同じ画像を使うため、再実行時にFigureの描画・変換が起きない）
+# pyplotのグラフ管理に登録されないよう、Figureは直接生成する
+@st.cache_data(show_spinner=False, max_entries=256)
+def make_corr_png(df_key, numeric_cols, _corr_matrix):
+    """相関係数のヒートマップを描画する"""
+    fig = Figure(figsize=(14, 10))
+    ax = fig.subplots()
+    sns.heatmap(_corr_matrix, annot=True, cmap='coolwarm', fmt='.2f', ax=ax)
+    return render_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def make_count_png(df_key, _df, col_name):
+    """カテゴリごとの件数グラフ（上位20件）を描画する"""
+    top_counts = compute_value_counts(df_key, _df, col_name).nlargest(20)
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    # 集計済みの件数をそのまま横棒グラフにする（件数の多い順に上から並べる）
+    positions = np.arange(len(top_counts))
+    ax.barh(positions, top_counts.to_numpy())
+    ax.set_yticks(positions, labels=top_counts.index.astype(str))
+    ax.invert_yaxis()
+    ax.set(xlabel='件数', ylabel=col_name)
+    ax.set_title(f'カテゴリごとの件数（上位20件）')
+    fig.tight_layout()
+    return render_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def make_dist_png(df_key, _df, col_name, bins):
+    """数値列の箱ひげ図とヒストグラムを上下に並べて描画する"""
+    stats = compute_numeric_stats(df_key, _df, col_name)
+    counts, edges = compute_histogram(df_key, _df, col_name, bins, stats["range"])
+    fig = Figure(figsize=(8, 6))
+    ax_box, ax_hist = fig.subplots(
+        2, 1, sharex=True,
+        gridspec_kw={"height_ratios": (.15, .85)}
+    )
+    # 上段に箱ひげ図（計算済みの四分位数から描画）
+    ax_box.bxp([stats["box"]], vert=False, showfliers=False, widths=0.6)
+    ax_box.set_title(f'「{col_name}」の箱ひげ図とヒストグラム')
+    ax_box.set(xlabel='', yticks=[]) # 上のグラフのx軸ラベルを消す
+
+    # 下段にヒストグラム（計算済みの度数から描画）
+    ax_hist.stairs(counts, edges, fill=True, alpha=0.6)
+    if stats["kde"] is not None:
+        grid, density = stats["kde"]
+        # 密度を件数のスケールに合わせて重ねる
+        ax_hist.plot(grid, density * stats["size"] * np.diff(edges).mean())
+    ax_hist.set(xlabel='値', ylabel='件数') # x軸ラベルを共通で設定
+
+    fig.subplots_adjust(hspace=0) # グラフ間の余白をなくす
+    return render_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def make_timeseries_png(df_key, _df, time_col, plot_cols):
+    """全ての数値列の推移を、X軸を共有した1枚のグラフにまとめて描画する"""
+    n_plots = len(plot_cols)
+    fig = Figure(figsize=(12, 3 * n_plots))
+    axes = fig.subplots(n_plots, 1, sharex=True, squeeze=False)
+    for ax, num_col in zip(axes[:, 0], plot_cols):
+        # 画面の横幅以上の点は見えないため、2000点まで間引いてから描画する
+        x_ds, y_ds = downsample_series(_df, time_col, num_col)
+        ax.plot(x_ds, y_ds, linewidth=0.8)
+        ax.set_title(f'{time_col}に対する{num_col}の推移')
+    axes[-1, 0].tick_params(axis='x', rotation=45)
+    fig.tight_layout()
+    return render_png(fig)
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def make_zoom_png(df_key, _df, time_col, col_name):
+    """1つの数値列の推移を拡大して描画する"""
+    fig = Figure(figsize=(12, 5))
+    ax = fig.subplots()
+    x_ds, y_ds = downsample_series(_df, time_col, col_name)
+    ax.plot(x_ds, y_ds, linewidth=0.8)
+    ax.set_title(f'{time_col}に対する{col_name}の推移')
+    ax.tick_params(axis='x', rotation=45)
+    fig.tight_layout()
+    return render_png(fig)
+
+def create_download_button(png, file_name, label="このグラフをダウンロード"):
+    """PNG画像のバイト列からダウンロードボタンを生成する"""
     st.download_button(
         label=label,
-        data=buf.getvalue(),
+        data=png,
         file_name=file_name,
         mime="image/png",
     )
 
-# --- サイドバー ---
-with st.sidebar:
-    st.header("1. ファイルをアップロード")
-    uploaded_file = st.file_uploader("CSVまたはExcelファイルをアップロード", type=['csv', 'xlsx'])
-
-    if uploaded_file is not None:
-        try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file, parse_dates=True)
-            else:
-                df = pd.read_excel(uploaded_file)
-            st.session_state.df = df
-            st.success("ファイルが正常に読み込まれました！")
-        except Exception as e:
-            st.error(f"ファイルの読み込み中にエラーが発生しました: {e}")
-
-# --- メイン画面 ---
-if st.session_state.df is not None:
-    df = st.session_state.df
-
+# --- レポートの各セクション ---
+# セクションごとにfragmentにして、ウィジェット操作時はそのセクションだけを再実行する
+@st.fragment
+def show_overview_section(df, df_key, numeric_cols):
     # ▼▼▼ セクション1: データ全体の概要と相関分析 ▼▼▼
     st.header("セクション1: データ全体の概要と相関分析")
     with st.expander("データプレビュー、基本情報などを表示", expanded=True):
@@ -57,28 +411,37 @@ if st.session_state.df is not None:
         st.dataframe(df.head())
         st.subheader("基本情報")
         st.markdown(f"**行数:** {df.shape[0]} 行, **列数:** {df.shape[1]} 列")
+        # 全列を走査する集計は、表示を選んだときだけ計算する
+        if st.checkbox("基本統計量と列ごとの要約を表示", value=False):
+            if len(df) > SUMMARY_MAX_ROWS:
+                st.caption(f"※ 行数が多いため、基本統計量と列ごとの要約（欠損値の数を除く）は{SUMMARY_SAMPLE_ROWS:,}行のサンプルから求めた概算値です。")
+            st.subheader("基本統計量")
+            st.dataframe(compute_describe(df_key, df))
+            st.subheader("列ごとの要約（欠損値の数など）")
+            st.dataframe(compute_column_summary(df_key, df, tuple(numeric_cols)))
 
     st.subheader("全体の相関分析")
-    numeric_cols = df.select_dtypes(include=np.number).columns
     if len(numeric_cols) > 1:
         st.write("▼ 相関係数")
-        corr_matrix = df[numeric_cols].corr()
+        corr_matrix = compute_corr(df_key, df, tuple(numeric_cols))
         st.dataframe(corr_matrix)
         
         st.write("▼ ヒートマップ")
-        fig_corr, ax_corr = plt.subplots(figsize=(14, 10))
-        sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', fmt='.2f', ax=ax_corr)
-        st.pyplot(fig_corr)
-        create_download_button(fig_corr, "correlation_heatmap.png", "ヒートマップをダウンロード")
+        png_corr = make_corr_png(df_key, tuple(numeric_cols), corr_matrix)
+        st.image(png_corr, width="stretch")
+        create_download_button(png_corr, "correlation_heatmap.png", "ヒートマップをダウンロード")
     else:
         st.info("相関分析を行うには、少なくとも2つ以上の数値列が必要です。")
     st.markdown("---")
     # ▲▲▲ セクション1ここまで ▲▲▲
 
 
+@st.fragment
+def show_column_section(df, df_key, categorical_cols):
     # ▼▼▼ セクション2: 全カラムの個別詳細分析 ▼▼▼
     st.header("セクション2: 全カラムの個別詳細分析")
     st.write("データフレームの全ての列について、データ型に応じた分析を自動で行います。")
+    hist_bins = st.slider("ヒストグラムのビン数", 5, 50, 10)
 
     for col_name in df.columns:
         st.subheader(f"【 {col_name} 】列の分析結果", divider='blue')
@@ -86,69 +449,52 @@ if st.session_state.df is not None:
         col1, col2 = st.columns([1, 2])
 
         # --- 数値データの場合 ---
-        if pd.api.types.is_numeric_dtype(df[col_name]):
+        if col_name not in categorical_cols:
             with col1:
                 st.write("**統計量**")
-                stats_df = df[col_name].describe()
-                stats_df['variance'] = df[col_name].var()
-                st.dataframe(stats_df)
+                st.dataframe(compute_column_describe(df_key, df, col_name))
 
             with col2:
                 # ▼▼▼ 変更点: 欠損値のみの列の場合、エラーを回避 ▼▼▼
-                if df[col_name].dropna().empty:
+                if compute_numeric_stats(df_key, df, col_name) is None:
                     st.write("**分布**")
                     st.info("この列は欠損値のみのため、グラフを描画できません。")
                 else:
                     st.write("**分布（箱ひげ図とヒストグラム）**")
                     # ▼▼▼ 変更点: 箱ひげ図とヒストグラムを結合して表示 ▼▼▼
-                    fig_dist, (ax_box, ax_hist) = plt.subplots(
-                        2, 1, sharex=True, figsize=(8, 6),
-                        gridspec_kw={"height_ratios": (.15, .85)}
-                    )
-                    # 上段に箱ひげ図
-                    sns.boxplot(x=df[col_name], ax=ax_box)
-                    ax_box.set_title(f'「{col_name}」の箱ひげ図とヒストグラム')
-                    ax_box.set(xlabel='') # 上のグラフのx軸ラベルを消す
-                    
-                    # 下段にヒストグラム
-                    sns.histplot(df[col_name], kde=True, ax=ax_hist)
-                    ax_hist.set(xlabel='値') # x軸ラベルを共通で設定
-                    
-                    plt.subplots_adjust(hspace=0) # グラフ間の余白をなくす
-                    st.pyplot(fig_dist)
-                    create_download_button(fig_dist, f"distribution_{col_name}.png")
+                    png_dist = make_dist_png(df_key, df, col_name, hist_bins)
+                    st.image(png_dist, width="stretch")
+                    create_download_button(png_dist, f"distribution_{col_name}.png")
                     # ▲▲▲ 変更ここまで ▲▲▲
 
         # --- カテゴリデータ（文字列など）の場合 ---
         else:
             with col1:
                 st.write("**統計量**")
-                stats_df = df[col_name].describe()
-                st.dataframe(stats_df)
+                st.dataframe(compute_column_describe(df_key, df, col_name))
                 
                 st.write("**カテゴリ別件数（上位10件）**")
-                st.dataframe(df[col_name].value_counts().nlargest(10))
+                value_counts = compute_value_counts(df_key, df, col_name)
+                st.dataframe(value_counts.nlargest(10))
 
             with col2:
                 st.write("**件数グラフ（上位20件）**")
-                unique_count = df[col_name].nunique()
+                unique_count = int((value_counts > 0).sum())
                 if unique_count > 20:
                     st.warning(f"カテゴリ数が{unique_count}と多いため、グラフ描画を上位20件に制限します。")
                 
-                fig_count, ax_count = plt.subplots(figsize=(8, 6))
-                sns.countplot(y=df[col_name], order=df[col_name].value_counts().nlargest(20).index, ax=ax_count)
-                ax_count.set_title(f'カテゴリごとの件数（上位20件）')
-                plt.tight_layout()
-                st.pyplot(fig_count)
-                create_download_button(fig_count, f"countplot_{col_name}.png")
+                png_count = make_count_png(df_key, df, col_name)
+                st.image(png_count, width="stretch")
+                create_download_button(png_count, f"countplot_{col_name}.png")
         
         st.markdown("---")
     # ▲▲▲ セクション2ここまで ▲▲▲
 
 
+@st.fragment
+def show_timeseries_section(df, df_key, numeric_cols, datetime_cols):
     # ▼▼▼ セクション3: 時系列データの自動グラフ化 ▼▼▼
     st.header("セクション3: 時系列グラフ（該当列が存在する場合のみ）")
-    datetime_cols = df.select_dtypes(include=['datetime64', 'datetime64[ns]']).columns.tolist()
 
     if not datetime_cols:
         st.info("データ内に日付・時刻形式の列が見つかりませんでした。")
@@ -156,18 +502,55 @@ if st.session_state.df is not None:
         time_col = datetime_cols[0]
         st.success(f"時系列データ列 **`{time_col}`** を検知しました。これをX軸として、全ての数値列の折れ線グラフを自動生成します。")
         
-        for num_col in numeric_cols:
-            if num_col != time_col:
-                st.subheader(f"時系列プロット: `{num_col}`")
-                fig_line, ax_line = plt.subplots(figsize=(12, 5))
-                sns.lineplot(x=df[time_col], y=df[num_col], ax=ax_line)
-                ax_line.set_title(f'{time_col}に対する{num_col}の推移')
-                ax_line.tick_params(axis='x', rotation=45)
-                plt.tight_layout()
-                st.pyplot(fig_line)
-                create_download_button(fig_line, f"timeseries_{time_col}_vs_{num_col}.png")
+        plot_cols = [c for c in numeric_cols if c != time_col]
+        if not plot_cols:
+            st.info("時系列グラフを描画できる数値列がありません。")
+        else:
+            png_line = make_timeseries_png(df_key, df, time_col, tuple(plot_cols))
+            st.image(png_line, width="stretch")
+            create_download_button(png_line, f"timeseries_{time_col}.png", "時系列グラフをまとめてダウンロード")
+
+            st.subheader("時系列プロットの拡大表示")
+            zoom_col = st.selectbox("拡大表示する列を選択", plot_cols)
+            png_zoom = make_zoom_png(df_key, df, time_col, zoom_col)
+            st.image(png_zoom, width="stretch")
+            create_download_button(png_zoom, f"timeseries_{time_col}_vs_{zoom_col}.png")
     # ▲▲▲ セクション3ここまで ▲▲▲
 
+
+# --- サイドバー ---
+with st.sidebar:
+    st.header("1. ファイルをアップロード")
+    uploaded_file = st.file_uploader("CSVまたはExcelファイルをアップロード", type=['csv', 'xlsx'])
+    downcast = st.checkbox("メモリ節約モード（数値列を小さい型に変換）", value=False)
+
+    if uploaded_file is not None:
+        try:
+            # ファイル内容のハッシュは、アップロードごとに1度だけ計算する
+            if uploaded_file.file_id != st.session_state.file_id:
+                st.session_state.file_hash = hashlib.md5(uploaded_file.getvalue()).hexdigest()
+                st.session_state.file_id = uploaded_file.file_id
+            # 型変換の有無で中身が変わるため、キャッシュのキーにも含める
+            df_key = f"{st.session_state.file_hash}-{downcast}"
+            if df_key != st.session_state.df_key:
+                df = load_data(df_key, uploaded_file, downcast)
+                st.session_state.df = df
+                st.session_state.df_key = df_key
+                # データ型ごとの列リストは読み込み時に1度だけ求めて使い回す
+                st.session_state.numeric_cols = df.select_dtypes(include=np.number).columns.tolist()
+                st.session_state.datetime_cols = df.select_dtypes(include=['datetime64', 'datetime64[ns]']).columns.tolist()
+                st.session_state.categorical_cols = [c for c in df.columns if not pd.api.types.is_numeric_dtype(df[c])]
+            st.success("ファイルが正常に読み込まれました！")
+        except Exception as e:
+            st.error(f"ファイルの読み込み中にエラーが発生しました: {e}")
+
+# --- メイン画面 ---
+if st.session_state.df is not None:
+    df = st.session_state.df
+    df_key = st.session_state.df_key
+    show_overview_section(df, df_key, st.session_state.numeric_cols)
+    show_column_section(df, df_key, st.session_state.categorical_cols)
+    show_timeseries_section(df, df_key, st.session_state.numeric_cols, st.session_state.datetime_cols)
 else:
     st.info("サイドバーからファイル（CSVまたはExcel）をアップロードして分析を開始してください。")
 